@@ -24,11 +24,35 @@
 import sys
 import argparse
 import xml.etree.ElementTree as ET
-import re
+import multiprocessing
+import operator
 import os
 
+try:
+    from sys import intern
+except ImportError:
+    # Python 2 has intern() as a builtin.
+    pass
+
+try:
+    provider_enum_translation = str.maketrans(' .', '__')
+except AttributeError:
+    # Python 2
+    import string
+    provider_enum_translation = string.maketrans(' .', '__')
+
+def provider_enum_name(condition_name):
+    # Turns the human-readable name of a provider (e.g. "Desktop
+    # OpenGL 1.5") into the C enum name we use for referring to it
+    # (Desktop_OpenGL_1_5).
+    return condition_name.translate(provider_enum_translation).replace('\\"', '')
+
 class GLProvider(object):
-    def __init__(self, condition, condition_name, loader, name):
+    # There's one of these for every function in every feature and
+    # extension that provides it, so don't give each a __dict__.
+    __slots__ = ('condition', 'condition_name', 'loader', 'name', 'enum')
+
+    def __init__(self, condition, condition_name, enum, loader, name):
         # C code for determining if this function is available.
         # (e.g. epoxy_is_desktop_gl() && epoxy_gl_version() >= 20
         self.condition = condition
@@ -45,13 +69,43 @@ class GLProvider(object):
         # ARB/EXT/whatever-decorated variant).
         self.name = name
 
-        # This is the C enum name we'll use for referring to this provider.
-        self.enum = condition_name
-        self.enum = self.enum.replace(' ', '_')
-        self.enum = self.enum.replace('\\"', '')
-        self.enum = self.enum.replace('.', '_')
+        # This is the C enum name we'll use for referring to this
+        # provider, from provider_enum_name().
+        self.enum = enum
 
 class GLFunction(object):
+    # There are thousands of these for gl.xml, so don't give each a
+    # __dict__.
+    __slots__ = (
+        'name',
+        'ptr_type',
+        'ret_type',
+        'providers',
+        'args',
+        'wrapped_name',
+        'public',
+        'arg_list_names',
+        'arg_decls',
+        '_args_list',
+        '_args_decl',
+        'uses_weird_glx_types',
+        'alias_name',
+        'alias_func',
+        'alias_exts',
+    )
+
+    # These are functions with hand-written wrapper code in
+    # dispatch_common.c.  Their dispatch entries are replaced with
+    # non-public symbols with a "_unwrapped" suffix.
+    wrapped_functions = frozenset((
+        'glBegin',
+        'glEnd',
+        'wglMakeCurrent',
+        'wglMakeContextCurrentEXT',
+        'wglMakeContextCurrentARB',
+        'wglMakeAssociatedContextCurrentAMD',
+    ))
+
     def __init__(self, ret_type, name):
         self.name = name
         self.ptr_type = 'PFN' + name.upper() + 'PROC'
@@ -59,32 +113,24 @@ class GLFunction(object):
         self.providers = {}
         self.args = []
 
-        # These are functions with hand-written wrapper code in
-        # dispatch_common.c.  Their dispatch entries are replaced with
-        # non-public symbols with a "_unwrapped" suffix.
-        wrapped_functions = {
-            'glBegin',
-            'glEnd',
-            'wglMakeCurrent',
-            'wglMakeContextCurrentEXT',
-            'wglMakeContextCurrentARB',
-            'wglMakeAssociatedContextCurrentAMD',
-        }
-
-        if name in wrapped_functions:
+        if name in GLFunction.wrapped_functions:
             self.wrapped_name = name + '_unwrapped'
             self.public = ''
         else:
             self.wrapped_name = name
             self.public = 'EPOXY_PUBLIC '
 
-        # This is the string of C code for passing through the
-        # arguments to the function.
-        self.args_list = ''
+        # The C code for passing through each argument to the
+        # function, and for declaring each argument.  These are joined
+        # into args_list and args_decl the first time they're needed.
+        self.arg_list_names = []
+        self.arg_decls = []
+        self._args_list = None
+        self._args_decl = None
 
-        # This is the string of C code for declaring the arguments
-        # list.
-        self.args_decl = 'void'
+        # Whether any of the arguments use types from the ancient
+        # SGIX GLX extensions that aren't defined anywhere in Xlib.
+        self.uses_weird_glx_types = False
 
         # This is the string name of the function that this is an
         # alias of, or self.name.  This initially comes from the
@@ -129,16 +175,33 @@ class GLFunction(object):
         else:
             arg_list_name = arg_name
 
+        if 'VLServer' in arg_type or 'DMparams' in arg_type:
+            self.uses_weird_glx_types = True
+
         self.args.append((arg_type, arg_name))
-        if self.args_decl == 'void':
-            self.args_list = arg_list_name
-            self.args_decl = arg_type + ' ' + arg_name
-        else:
-            self.args_list += ', ' + arg_list_name
-            self.args_decl += ', ' + arg_type + ' ' + arg_name
+        self.arg_list_names.append(arg_list_name)
+        self.arg_decls.append(arg_type + ' ' + arg_name)
+        self._args_list = None
+        self._args_decl = None
+
+    @property
+    def args_list(self):
+        # This is the string of C code for passing through the
+        # arguments to the function.
+        if self._args_list is None:
+            self._args_list = ', '.join(self.arg_list_names)
+        return self._args_list
+
+    @property
+    def args_decl(self):
+        # This is the string of C code for declaring the arguments
+        # list.
+        if self._args_decl is None:
+            self._args_decl = ', '.join(self.arg_decls) or 'void'
+        return self._args_decl
 
-    def add_provider(self, condition, loader, condition_name):
-        self.providers[condition_name] = GLProvider(condition, condition_name,
+    def add_provider(self, condition, loader, condition_name, enum):
+        self.providers[condition_name] = GLProvider(condition, condition_name, enum,
                                                     loader, self.name)
 
     def add_alias(self, ext):
@@ -148,6 +211,20 @@ class GLFunction(object):
         ext.alias_func = self
 
 class Generator(object):
+    # Partial aliases of a few functions.  These are ones that aren't
+    # quite aliases, because of some trivial behavior difference (like
+    # whether to produce an error for a non-Genned name), but where
+    # we'd like to fall back to the similar function if the proper one
+    # isn't present.
+    half_aliases = {
+        'glBindVertexArray' : 'glBindVertexArrayAPPLE',
+        'glBindVertexArrayAPPLE' : 'glBindVertexArray',
+        'glBindFramebuffer' : 'glBindFramebufferEXT',
+        'glBindFramebufferEXT' : 'glBindFramebuffer',
+        'glBindRenderbuffer' : 'glBindRenderbufferEXT',
+        'glBindRenderbufferEXT' : 'glBindRenderbuffer',
+    }
+
     def __init__(self, target):
         self.target = target
         self.enums = {}
@@ -158,7 +235,10 @@ class Generator(object):
         self.entrypoint_string_offset = {}
         self.copyright_comment = None
         self.typedefs = ''
-        self.out_file = None
+        self.typedef_parts = []
+        # The text of the file being generated, as a list of
+        # fragments to be joined when it's written out.
+        self.out_buf = None
 
         # GL versions named in the registry, which we should generate
         # #defines for.
@@ -168,6 +248,11 @@ class Generator(object):
         # #defines for.
         self.supported_extensions = set()
 
+        # The functions provided by each feature and extension, as
+        # (condition, loader, human_name, [function names]) tuples, to
+        # be hooked up once all of the <command>s have been parsed.
+        self.require_statements = []
+
         # Dictionary mapping human-readable names of providers to a C
         # enum token that will be used to reference those names, to
         # reduce generated binary size.
@@ -182,109 +267,148 @@ class Generator(object):
         # provided the name of the symbol to be requested.
         self.provider_loader = {}
 
+        # Dictionary mapping human-readable names of providers to the
+        # C code for fetching the function pointer in
+        # gl_provider_resolver(), with the provider_loader format
+        # string already filled in.
+        self.provider_loader_expr = {}
+
+        # The human-readable names of the providers, in the order
+        # we generate code for them.
+        self.sorted_providers = []
+
+        # Dictionary mapping tuples of provider enums to the name of
+        # the providers array already written out for that list.
+        self.providers_arrays = {}
+
     def all_text_until_element_name(self, element, element_name):
-        text = ''
+        text = []
 
         if element.text is not None:
-            text += element.text
+            text.append(element.text)
 
         for child in element:
             if child.tag == element_name:
                 break
             if child.text:
-                text += child.text
+                text.append(child.text)
             if child.tail:
-                text += child.tail
-        return text
+                text.append(child.tail)
+        return ''.join(text)
 
     def out(self, text):
-        self.out_file.write(text)
+        self.out_buf.append(text)
 
     def outln(self, text):
-        self.out_file.write(text + '\n')
+        self.out_buf.append(text)
+        self.out_buf.append('\n')
+
+    def write_out_file(self, out_file):
+        # The generated files are built up in memory and written out
+        # in one go, rather than going through the file object for
+        # each of the tens of thousands of lines.  Encoding up front and
+        # writing in binary mode skips the text layer's encoder and
+        # newline translation, so the output is also byte-identical on
+        # every platform.
+        with open(out_file, 'wb') as f:
+            f.write(''.join(self.out_buf).encode('utf-8'))
+        self.out_buf = None
+
+    def parse_typedef(self, t):
+        if 'name' in t.attrib and t.attrib['name'] not in {'GLhandleARB'}:
+            return
 
-    def parse_typedefs(self, reg):
-        for t in reg.findall('types/type'):
-            if 'name' in t.attrib and t.attrib['name'] not in {'GLhandleARB'}:
-                continue
+        # The gles1/gles2-specific types are redundant
+        # declarations, and the different types used for them (int
+        # vs int32_t) caused problems on win32 builds.
+        api = t.attrib.get('api')
+        if api:
+            return
 
-            # The gles1/gles2-specific types are redundant
-            # declarations, and the different types used for them (int
-            # vs int32_t) caused problems on win32 builds.
-            api = t.get('api')
-            if api:
-                continue
+        if t.text is not None:
+            self.typedef_parts.append(t.text)
 
-            if t.text is not None:
-                self.typedefs += t.text
-
-            for child in t:
-                if child.tag == 'apientry':
-                    self.typedefs += 'APIENTRY'
-                if child.text:
-                    self.typedefs += child.text
-                if child.tail:
-                    self.typedefs += child.tail
-            self.typedefs += '\n'
-
-    def parse_enums(self, reg):
-        for enum in reg.findall('enums/enum'):
-            name = enum.get('name')
-
-            # wgl.xml's 0xwhatever definitions end up colliding with
-            # wingdi.h's decimal definitions of these.
-            if name in ['WGL_SWAP_OVERLAY', 'WGL_SWAP_UNDERLAY', 'WGL_SWAP_MAIN_PLANE']:
-                continue
+        for child in t:
+            if child.tag == 'apientry':
+                self.typedef_parts.append('APIENTRY')
+            if child.text:
+                self.typedef_parts.append(child.text)
+            if child.tail:
+                self.typedef_parts.append(child.tail)
+        self.typedef_parts.append('\n')
 
-            self.max_enum_name_len = max(self.max_enum_name_len, len(name))
-            self.enums[name] = enum.get('value')
+    def parse_enum(self, enum):
+        attrib = enum.attrib
+        name = attrib['name']
+
+        # wgl.xml's 0xwhatever definitions end up colliding with
+        # wingdi.h's decimal definitions of these.
+        if name in ['WGL_SWAP_OVERLAY', 'WGL_SWAP_UNDERLAY', 'WGL_SWAP_MAIN_PLANE']:
+            return
+
+        self.max_enum_name_len = max(self.max_enum_name_len, len(name))
+        self.enums[name] = attrib.get('value')
 
     def get_function_return_type(self, proto):
         # Everything up to the start of the name element is the return type.
         return self.all_text_until_element_name(proto, 'name').strip()
 
-    def parse_function_definitions(self, reg):
-        for command in reg.findall('commands/command'):
-            proto = command.find('proto')
-            name = proto.find('name').text
-            ret_type = self.get_function_return_type(proto)
+    def parse_function_definition(self, command):
+        proto = command.find('proto')
+        name = intern(proto.find('name').text)
+        # The same handful of C types (GLenum, GLuint, const GLfloat *,
+        # ...) are spelled out over and over again, so share one copy
+        # of each.
+        ret_type = intern(self.get_function_return_type(proto))
 
-            func = GLFunction(ret_type, name)
+        func = GLFunction(ret_type, name)
 
-            for arg in command.findall('param'):
-                func.add_arg(self.all_text_until_element_name(arg, 'name').strip(),
-                             arg.find('name').text)
+        for arg in command.iterfind('param'):
+            func.add_arg(intern(self.all_text_until_element_name(arg, 'name').strip()),
+                         arg.find('name').text)
 
-            alias = command.find('alias')
-            if alias is not None:
-                # Note that some alias references appear before the
-                # target command is defined (glAttachObjectARB() ->
-                # glAttachShader(), for example).
-                func.alias_name = alias.get('name')
+        alias = command.find('alias')
+        if alias is not None:
+            # Note that some alias references appear before the
+            # target command is defined (glAttachObjectARB() ->
+            # glAttachShader(), for example).
+            func.alias_name = alias.get('name')
 
-            self.functions[name] = func
+        self.functions[name] = func
 
     def drop_weird_glx_functions(self):
         # Drop a few ancient SGIX GLX extensions that use types not defined
         # anywhere in Xlib.  In glxext.h, they're protected by #ifdefs for the
         # headers that defined them.
         weird_functions = [name for name, func in self.functions.items()
-                           if 'VLServer' in func.args_decl
-                           or 'DMparams' in func.args_decl]
+                           if func.uses_weird_glx_types]
 
         for name in weird_functions:
             del self.functions[name]
 
     def resolve_aliases(self):
         for func in self.functions.values():
-            # Find the root of the alias tree, and add ourselves to it.
-            if func.alias_name != func.name:
-                alias_func = func
-                while alias_func.alias_name != alias_func.name:
-                    alias_func = self.functions[alias_func.alias_name]
-                func.alias_name = alias_func.name
-                func.alias_func = alias_func
-                alias_func.alias_exts.append(func)
+            # Skip roots, and functions already resolved on the way to
+            # the root from an earlier alias.
+            if func.alias_name == func.name or func.alias_func is not None:
+                continue
+
+            # Find the root of the alias tree, and add ourselves and
+            # every alias we passed through on the way to it, so that
+            # later lookups don't walk the same chain again.
+            chain = []
+            alias_func = func
+            while alias_func.alias_name != alias_func.name:
+                if alias_func.alias_func is not None:
+                    alias_func = alias_func.alias_func
+                    break
+                chain.append(alias_func)
+                alias_func = self.functions[alias_func.alias_name]
+
+            for node in chain:
+                node.alias_name = alias_func.name
+                node.alias_func = alias_func
+                alias_func.alias_exts.append(node)
 
     def prepare_provider_enum(self):
         self.provider_enum = {}
@@ -304,111 +428,126 @@ class Generator(object):
                 self.provider_enum[provider.condition_name] = provider.enum
                 self.provider_condition[provider.condition_name] = provider.condition
                 self.provider_loader[provider.condition_name] = provider.loader
+                self.provider_loader_expr[provider.condition_name] = provider.loader.format("entrypoint_strings + entrypoints[i]")
+
+        self.sorted_providers = sorted(self.provider_enum.keys())
 
     def sort_functions(self):
-        self.sorted_functions = sorted(self.functions.values(), key=lambda func: func.name)
+        self.sorted_functions = sorted(self.functions.values(), key=operator.attrgetter('name'))
 
     def process_require_statements(self, feature, condition, loader, human_name):
-        for command in feature.findall('require/command'):
-            name = command.get('name')
-
-            # wgl.xml describes 6 functions in WGL 1.0 that are in
-            # gdi32.dll instead of opengl32.dll, and we would need to
-            # change up our symbol loading to support that.  Just
-            # don't wrap those functions.
-            if self.target == 'wgl' and 'wgl' not in name:
-                del self.functions[name]
-                continue
+        names = [command.attrib['name'] for command in feature.iterfind('require/command')]
+        self.require_statements.append((condition, loader, human_name, names))
+
+    def add_required_providers(self):
+        for condition, loader, human_name, names in self.require_statements:
+            # The provider names are used as keys of the provider
+            # tables and of every function's providers, so share one
+            # copy.
+            human_name = intern(human_name)
+            enum = provider_enum_name(human_name)
+            for name in names:
+                # wgl.xml describes 6 functions in WGL 1.0 that are in
+                # gdi32.dll instead of opengl32.dll, and we would need
+                # to change up our symbol loading to support that.
+                # Just don't wrap those functions.
+                if self.target == 'wgl' and 'wgl' not in name:
+                    del self.functions[name]
+                    continue
 
-            func = self.functions[name]
-            func.add_provider(condition, loader, human_name)
-
-    def parse_function_providers(self, reg):
-        for feature in reg.findall('feature'):
-            api = feature.get('api') # string gl, gles1, gles2, glx
-            m = re.match(r'([0-9])\.([0-9])', feature.get('number'))
-            version = int(m.group(1)) * 10 + int(m.group(2))
-
-            self.supported_versions.add(feature.get('name'))
-
-            if api == 'gl':
-                human_name = 'Desktop OpenGL {0}'.format(feature.get('number'))
-                condition = 'epoxy_is_desktop_gl()'
-
-                loader = 'epoxy_get_core_proc_address({0}, {1})'.format('{0}', version)
-                if version >= 11:
-                    condition += ' && epoxy_conservative_gl_version() >= {0}'.format(version)
-            elif api == 'gles2':
-                human_name = 'OpenGL ES {0}'.format(feature.get('number'))
-                condition = '!epoxy_is_desktop_gl() && epoxy_gl_version() >= {0}'.format(version)
-
-                if version <= 20:
-                    loader = 'epoxy_gles2_dlsym({0})'
-                else:
-                    loader = 'epoxy_gles3_dlsym({0})'
-            elif api == 'gles1':
-                human_name = 'OpenGL ES 1.0'
-                condition = '!epoxy_is_desktop_gl() && epoxy_gl_version() >= 10 && epoxy_gl_version() < 20'
-                loader = 'epoxy_gles1_dlsym({0})'
-            elif api == 'glx':
-                human_name = 'GLX {0}'.format(version)
-                # We could just always use GPA for loading everything
-                # but glXGetProcAddress(), but dlsym() is a more
-                # efficient lookup.
-                if version > 13:
-                    condition = 'epoxy_conservative_glx_version() >= {0}'.format(version)
-                    loader = 'glXGetProcAddress((const GLubyte *){0})'
-                else:
-                    condition = 'true'
-                    loader = 'epoxy_glx_dlsym({0})'
-            elif api == 'egl':
-                human_name = 'EGL {0}'.format(version)
-                if version > 10:
-                    condition = 'epoxy_conservative_egl_version() >= {0}'.format(version)
-                else:
-                    condition = 'true'
-                # All EGL core entrypoints must be dlsym()ed out --
-                # eglGetProcAdddress() will return NULL.
-                loader = 'epoxy_egl_dlsym({0})'
-            elif api == 'wgl':
-                human_name = 'WGL {0}'.format(version)
-                condition = 'true'
-                loader = 'epoxy_gl_dlsym({0})'
-            elif api == 'glsc2':
-                continue
+                func = self.functions[name]
+                func.add_provider(condition, loader, human_name, enum)
+        self.require_statements = None
+
+    def parse_feature(self, feature):
+        attrib = feature.attrib
+        api = attrib.get('api') # string gl, gles1, gles2, glx
+        number = attrib['number']
+        # Versions are always of the form "major.minor".
+        major, minor = number.split('.')
+        version = int(major) * 10 + int(minor)
+
+        self.supported_versions.add(attrib['name'])
+
+        if api == 'gl':
+            human_name = 'Desktop OpenGL {0}'.format(number)
+            condition = 'epoxy_is_desktop_gl()'
+
+            loader = 'epoxy_get_core_proc_address({0}, {1})'.format('{0}', version)
+            if version >= 11:
+                condition += ' && epoxy_conservative_gl_version() >= {0}'.format(version)
+        elif api == 'gles2':
+            human_name = 'OpenGL ES {0}'.format(number)
+            condition = '!epoxy_is_desktop_gl() && epoxy_gl_version() >= {0}'.format(version)
+
+            if version <= 20:
+                loader = 'epoxy_gles2_dlsym({0})'
             else:
-                sys.exit('unknown API: "{0}"'.format(api))
-
-            self.process_require_statements(feature, condition, loader, human_name)
-
-        for extension in reg.findall('extensions/extension'):
-            extname = extension.get('name')
-
-            self.supported_extensions.add(extname)
-
-            # 'supported' is a set of strings like gl, gles1, gles2,
-            # or glx, which are separated by '|'
-            apis = extension.get('supported').split('|')
-            if 'glx' in apis:
-                human_name = 'GLX extension \\"{0}\\"'.format(extname)
-                condition = 'epoxy_conservative_has_glx_extension("{0}")'.format(extname)
+                loader = 'epoxy_gles3_dlsym({0})'
+        elif api == 'gles1':
+            human_name = 'OpenGL ES 1.0'
+            condition = '!epoxy_is_desktop_gl() && epoxy_gl_version() >= 10 && epoxy_gl_version() < 20'
+            loader = 'epoxy_gles1_dlsym({0})'
+        elif api == 'glx':
+            human_name = 'GLX {0}'.format(version)
+            # We could just always use GPA for loading everything
+            # but glXGetProcAddress(), but dlsym() is a more
+            # efficient lookup.
+            if version > 13:
+                condition = 'epoxy_conservative_glx_version() >= {0}'.format(version)
                 loader = 'glXGetProcAddress((const GLubyte *){0})'
-                self.process_require_statements(extension, condition, loader, human_name)
-            if 'egl' in apis:
-                human_name = 'EGL extension \\"{0}\\"'.format(extname)
-                condition = 'epoxy_conservative_has_egl_extension("{0}")'.format(extname)
-                loader = 'eglGetProcAddress({0})'
-                self.process_require_statements(extension, condition, loader, human_name)
-            if 'wgl' in apis:
-                human_name = 'WGL extension \\"{0}\\"'.format(extname)
-                condition = 'epoxy_conservative_has_wgl_extension("{0}")'.format(extname)
-                loader = 'wglGetProcAddress({0})'
-                self.process_require_statements(extension, condition, loader, human_name)
-            if {'gl', 'gles1', 'gles2'}.intersection(apis):
-                human_name = 'GL extension \\"{0}\\"'.format(extname)
-                condition = 'epoxy_conservative_has_gl_extension("{0}")'.format(extname)
-                loader = 'epoxy_get_proc_address({0})'
-                self.process_require_statements(extension, condition, loader, human_name)
+            else:
+                condition = 'true'
+                loader = 'epoxy_glx_dlsym({0})'
+        elif api == 'egl':
+            human_name = 'EGL {0}'.format(version)
+            if version > 10:
+                condition = 'epoxy_conservative_egl_version() >= {0}'.format(version)
+            else:
+                condition = 'true'
+            # All EGL core entrypoints must be dlsym()ed out --
+            # eglGetProcAdddress() will return NULL.
+            loader = 'epoxy_egl_dlsym({0})'
+        elif api == 'wgl':
+            human_name = 'WGL {0}'.format(version)
+            condition = 'true'
+            loader = 'epoxy_gl_dlsym({0})'
+        elif api == 'glsc2':
+            return
+        else:
+            sys.exit('unknown API: "{0}"'.format(api))
+
+        self.process_require_statements(feature, condition, loader, human_name)
+
+    def parse_extension(self, extension):
+        attrib = extension.attrib
+        extname = attrib['name']
+
+        self.supported_extensions.add(extname)
+
+        # 'supported' is a set of strings like gl, gles1, gles2,
+        # or glx, which are separated by '|'
+        apis = frozenset(attrib['supported'].split('|'))
+        if 'glx' in apis:
+            human_name = 'GLX extension \\"{0}\\"'.format(extname)
+            condition = 'epoxy_conservative_has_glx_extension("{0}")'.format(extname)
+            loader = 'glXGetProcAddress((const GLubyte *){0})'
+            self.process_require_statements(extension, condition, loader, human_name)
+        if 'egl' in apis:
+            human_name = 'EGL extension \\"{0}\\"'.format(extname)
+            condition = 'epoxy_conservative_has_egl_extension("{0}")'.format(extname)
+            loader = 'eglGetProcAddress({0})'
+            self.process_require_statements(extension, condition, loader, human_name)
+        if 'wgl' in apis:
+            human_name = 'WGL extension \\"{0}\\"'.format(extname)
+            condition = 'epoxy_conservative_has_wgl_extension("{0}")'.format(extname)
+            loader = 'wglGetProcAddress({0})'
+            self.process_require_statements(extension, condition, loader, human_name)
+        if apis & {'gl', 'gles1', 'gles2'}:
+            human_name = 'GL extension \\"{0}\\"'.format(extname)
+            condition = 'epoxy_conservative_has_gl_extension("{0}")'.format(extname)
+            loader = 'epoxy_get_proc_address({0})'
+            self.process_require_statements(extension, condition, loader, human_name)
 
     def fixup_bootstrap_function(self, name, loader):
         # We handle glGetString(), glGetIntegerv(), and
@@ -421,19 +560,54 @@ class Generator(object):
 
         func = self.functions[name]
         func.providers = {}
-        func.add_provider('true', loader, 'always present')
+        func.add_provider('true', loader, 'always present',
+                          provider_enum_name('always present'))
 
-    def parse(self, xml_file):
-        reg = ET.parse(xml_file)
-        comment = reg.find('comment')
-        if comment is not None:
+    def parse_copyright_comment(self, comment):
+        if self.copyright_comment is None:
             self.copyright_comment = comment.text
-        else:
+
+    def parse(self, xml_file):
+        # The elements we care about, by the tag of their parent and
+        # their own tag, since <command>, <enum> and <type> also show
+        # up inside <require> blocks.
+        parsers = {
+            ('registry', 'comment'): self.parse_copyright_comment,
+            ('types', 'type'): self.parse_typedef,
+            ('enums', 'enum'): self.parse_enum,
+            ('commands', 'command'): self.parse_function_definition,
+            ('registry', 'feature'): self.parse_feature,
+            ('extensions', 'extension'): self.parse_extension,
+        }
+
+        # Make a single streaming pass over the registry, handing each
+        # of those elements to its parser once it has been fully read
+        # and then throwing it away, so that we never hold the whole
+        # document in memory.  The <feature> and <extensions> sections
+        # may come before the <commands> they refer to, so the
+        # providers they list are only added once the pass is done.
+        path = []
+        for event, elem in ET.iterparse(xml_file, events=('start', 'end')):
+            if event == 'start':
+                path.append(elem.tag)
+                continue
+
+            path.pop()
+            if not path:
+                break
+
+            parser = parsers.get((path[-1], elem.tag))
+            if parser is not None:
+                parser(elem)
+            if parser is not None or path[-1] == 'registry':
+                elem.clear()
+
+        self.add_required_providers()
+
+        if self.copyright_comment is None:
             self.copyright_comment = ''
-        self.parse_typedefs(reg)
-        self.parse_enums(reg)
-        self.parse_function_definitions(reg)
-        self.parse_function_providers(reg)
+        self.typedefs = ''.join(self.typedef_parts)
+        self.typedef_parts = None
 
     def write_copyright_comment_body(self):
         for line in self.copyright_comment.splitlines():
@@ -442,12 +616,14 @@ class Generator(object):
             self.outln(' * ' + line)
 
     def write_enums(self):
-        for name in sorted(self.supported_versions):
-            self.outln('#define {0} 1'.format(name))
+        # The header is mostly long runs of one-line definitions, so
+        # each run is joined up and written out at once.
+        self.out(''.join('#define {0} 1\n'.format(name)
+                         for name in sorted(self.supported_versions)))
         self.outln('')
 
-        for name in sorted(self.supported_extensions):
-            self.outln('#define {0} 1'.format(name))
+        self.out(''.join('#define {0} 1\n'.format(name)
+                         for name in sorted(self.supported_extensions)))
         self.outln('')
 
         # We want to sort by enum number (which puts a bunch of things
@@ -458,17 +634,32 @@ class Generator(object):
         # for enums yet.
         sorted_by_name = sorted(self.enums.keys())
         sorted_by_number = sorted(sorted_by_name, key=lambda name: self.enums[name])
-        for name in sorted_by_number:
-            self.outln('#define ' + name.ljust(self.max_enum_name_len + 3) + self.enums[name] + '')
+        self.out(''.join('#define ' + name.ljust(self.max_enum_name_len + 3) + self.enums[name] + '\n'
+                         for name in sorted_by_number))
 
     def write_function_ptr_typedefs(self):
+        # Most aliases have exactly the same signature as the function
+        # they alias.  Only spell each signature out once per alias
+        # tree, and declare the other function pointer types in terms
+        # of the first one with that signature, which keeps the header
+        # (and its parsing by every user of epoxy) smaller.
+        ptr_type_for_signature = {}
+        lines = []
         for func in self.sorted_functions:
-            self.outln('typedef {0} (GLAPIENTRY *{1})({2});'.format(func.ret_type,
-                                                                    func.ptr_type,
-                                                                    func.args_decl))
+            signature = (func.alias_name,
+                         func.ret_type,
+                         tuple(arg_type for arg_type, arg_name in func.args))
+            ptr_type = ptr_type_for_signature.setdefault(signature, func.ptr_type)
+            if ptr_type == func.ptr_type:
+                lines.append('typedef {0} (GLAPIENTRY *{1})({2});\n'.format(func.ret_type,
+                                                                             func.ptr_type,
+                                                                             func.args_decl))
+            else:
+                lines.append('typedef {0} {1};\n'.format(ptr_type, func.ptr_type))
+        self.out(''.join(lines))
 
-    def write_header_header(self, out_file):
-        self.out_file = open(out_file, 'w')
+    def write_header_header(self):
+        self.out_buf = []
 
         self.outln('/* GL dispatch header.')
         self.outln(' * This is code-generated from the GL API XML files from Khronos.')
@@ -483,7 +674,7 @@ class Generator(object):
         self.outln('')
 
     def write_header(self, out_file):
-        self.write_header_header(out_file)
+        self.write_header_header()
 
         self.outln('#include "epoxy/common.h"')
 
@@ -539,20 +730,17 @@ class Generator(object):
         self.outln('')
         self.write_function_ptr_typedefs()
 
-        for func in self.sorted_functions:
-            self.outln('EPOXY_PUBLIC {0} (EPOXY_CALLSPEC *epoxy_{1})({2});'.format(func.ret_type,
-                                                                                   func.name,
-                                                                                   func.args_decl))
-            self.outln('')
+        self.out(''.join('EPOXY_PUBLIC {0} (EPOXY_CALLSPEC *epoxy_{1})({2});\n\n'.format(func.ret_type,
+                                                                                           func.name,
+                                                                                           func.args_decl)
+                         for func in self.sorted_functions))
 
-        for func in self.sorted_functions:
-            self.outln('#define {0} epoxy_{0}'.format(func.name))
+        self.out(''.join('#define {0} epoxy_{0}\n'.format(func.name)
+                         for func in self.sorted_functions))
 
-    def write_function_ptr_resolver(self, func):
-        self.outln('static {0}'.format(func.ptr_type))
-        self.outln('epoxy_{0}_resolver(void)'.format(func.wrapped_name))
-        self.outln('{')
+        self.write_out_file(out_file)
 
+    def write_function_ptr_resolver(self, func):
         providers = []
         # Make a local list of all the providers for this alias group
         alias_root = func
@@ -564,21 +752,9 @@ class Generator(object):
             for provider in alias_func.providers.values():
                 providers.append(provider)
 
-        # Add some partial aliases of a few functions.  These are ones
-        # that aren't quite aliases, because of some trivial behavior
-        # difference (like whether to produce an error for a
-        # non-Genned name), but where we'd like to fall back to the
-        # similar function if the proper one isn't present.
-        half_aliases = {
-            'glBindVertexArray' : 'glBindVertexArrayAPPLE',
-            'glBindVertexArrayAPPLE' : 'glBindVertexArray',
-            'glBindFramebuffer' : 'glBindFramebufferEXT',
-            'glBindFramebufferEXT' : 'glBindFramebuffer',
-            'glBindRenderbuffer' : 'glBindRenderbufferEXT',
-            'glBindRenderbufferEXT' : 'glBindRenderbuffer',
-        }
-        if func.name in half_aliases:
-            alias_func = self.functions[half_aliases[func.name]]
+        # Add some partial aliases of a few functions.
+        if func.name in Generator.half_aliases:
+            alias_func = self.functions[Generator.half_aliases[func.name]]
             for provider in alias_func.providers.values():
                 providers.append(provider)
 
@@ -586,33 +762,52 @@ class Generator(object):
             return (provider.name != func.name, provider.name, provider.enum)
         providers.sort(key=provider_sort)
 
+        # There's one of these per function, so build up the whole
+        # resolver and write it out at once.
+        lines = []
+
         if len(providers) != 1:
-            self.outln('    static const enum {0}_provider providers[] = {{'.format(self.target))
-            for provider in providers:
-                self.outln('        {0},'.format(provider.enum))
-            self.outln('        {0}_provider_terminator'.format(self.target))
-            self.outln('    };')
+            # Many functions end up with exactly the same list of
+            # providers, so each distinct list is only written out
+            # once, ahead of the first resolver that uses it.
+            provider_enums = tuple(provider.enum for provider in providers)
+            providers_array = self.providers_arrays.get(provider_enums)
+            if providers_array is None:
+                providers_array = '{0}_providers_{1}'.format(self.target, len(self.providers_arrays))
+                self.providers_arrays[provider_enums] = providers_array
+                lines.append('static const enum {0}_provider {1}[] = {{'.format(self.target,
+                                                                               providers_array))
+                lines.extend('    {0},'.format(enum) for enum in provider_enums)
+                lines.append('    {0}_provider_terminator'.format(self.target))
+                lines.append('};')
+                lines.append('')
+
+        lines.append('static {0}'.format(func.ptr_type))
+        lines.append('epoxy_{0}_resolver(void)'.format(func.wrapped_name))
+        lines.append('{')
 
-            self.outln('    static const uint32_t entrypoints[] = {')
+        if len(providers) != 1:
+            lines.append('    static const uint32_t entrypoints[] = {')
             if len(providers) > 1:
-                for provider in providers:
-                    self.outln('        {0} /* "{1}" */,'.format(self.entrypoint_string_offset[provider.name], provider.name))
+                lines.extend('        {0} /* "{1}" */,'.format(self.entrypoint_string_offset[provider.name], provider.name)
+                             for provider in providers)
             else:
-                self.outln('        0 /* None */,')
-            self.outln('    };')
+                lines.append('        0 /* None */,')
+            lines.append('    };')
 
-            self.outln('    return {0}_provider_resolver(entrypoint_strings + {1} /* "{2}" */,'.format(self.target,
-                                                                                                       self.entrypoint_string_offset[func.name],
-                                                                                                       func.name))
-            self.outln('                                providers, entrypoints);')
+            lines.append('    return {0}_provider_resolver(entrypoint_strings + {1} /* "{2}" */,'.format(self.target,
+                                                                                                         self.entrypoint_string_offset[func.name],
+                                                                                                         func.name))
+            lines.append('                                {0}, entrypoints);'.format(providers_array))
         else:
             assert providers[0].name == func.name
-            self.outln('    return {0}_single_resolver({1}, {2} /* {3} */);'.format(self.target,
-                                                                                    providers[0].enum,
-                                                                                    self.entrypoint_string_offset[func.name],
-                                                                                    func.name))
-        self.outln('}')
-        self.outln('')
+            lines.append('    return {0}_single_resolver({1}, {2} /* {3} */);'.format(self.target,
+                                                                                      providers[0].enum,
+                                                                                      self.entrypoint_string_offset[func.name],
+                                                                                      func.name))
+        lines.append('}')
+        lines.append('')
+        self.outln('\n'.join(lines))
 
     def write_thunks(self, func):
         # Writes out the function that's initially plugged into the
@@ -632,8 +827,7 @@ class Generator(object):
                                                                        func.args_list))
 
     def write_function_pointer(self, func):
-        self.outln('{0} epoxy_{1} = epoxy_{1}_global_rewrite_ptr;'.format(func.ptr_type, func.wrapped_name))
-        self.outln('')
+        self.outln('{0} epoxy_{1} = epoxy_{1}_global_rewrite_ptr;\n'.format(func.ptr_type, func.wrapped_name))
 
     def write_provider_enums(self):
         # Writes the enum declaration for the list of providers
@@ -642,15 +836,12 @@ class Generator(object):
         self.outln('')
         self.outln('enum {0}_provider {{'.format(self.target))
 
-        sorted_providers = sorted(self.provider_enum.keys())
-
         # We always put a 0 enum first so that we can have a
         # terminator in our arrays
         self.outln('    {0}_provider_terminator = 0,'.format(self.target))
 
-        for human_name in sorted_providers:
-            enum = self.provider_enum[human_name]
-            self.outln('    {0},'.format(enum))
+        self.out(''.join('    {0},\n'.format(self.provider_enum[human_name])
+                         for human_name in self.sorted_providers))
         self.outln('} PACKED;')
         self.outln('ENDPACKED')
         self.outln('')
@@ -659,14 +850,14 @@ class Generator(object):
         # Writes the mapping from enums to the strings describing them
         # for epoxy_print_failure_reasons().
 
-        sorted_providers = sorted(self.provider_enum.keys())
-
         offset = 0
         self.outln('static const char *enum_string =')
-        for human_name in sorted_providers:
-            self.outln('    "{0}\\0"'.format(human_name))
+        lines = []
+        for human_name in self.sorted_providers:
+            lines.append('    "{0}\\0"\n'.format(human_name))
             self.enum_string_offset[human_name] = offset
             offset += len(human_name.replace('\\', '')) + 1
+        self.out(''.join(lines))
         self.outln('     ;')
         self.outln('')
         # We're using uint16_t for the offsets.
@@ -674,22 +865,32 @@ class Generator(object):
 
         self.outln('static const uint16_t enum_string_offsets[] = {')
         self.outln('    -1, /* {0}_provider_terminator, unused */'.format(self.target))
-        for human_name in sorted_providers:
-            enum = self.provider_enum[human_name]
-            self.outln('    {1}, /* {0} */'.format(enum, self.enum_string_offset[human_name]))
+        self.out(''.join('    {1}, /* {0} */\n'.format(self.provider_enum[human_name],
+                                                       self.enum_string_offset[human_name])
+                         for human_name in self.sorted_providers))
         self.outln('};')
         self.outln('')
 
     def write_entrypoint_strings(self):
         self.outln('static const char entrypoint_strings[] = {')
         offset = 0
+        lines = []
+        # The names only use a few dozen different characters, so
+        # format the line for each of those once, rather than once for
+        # every character of every name.
+        char_lines = {}
+        # sorted_functions comes from a dict, so each name only shows
+        # up once.
         for func in self.sorted_functions:
-            if func.name not in self.entrypoint_string_offset:
-                self.entrypoint_string_offset[func.name] = offset
-                offset += len(func.name) + 1
-                for c in func.name:
-                    self.outln("   '{0}',".format(c))
-                self.outln('   0, // {0}'.format(func.name))
+            self.entrypoint_string_offset[func.name] = offset
+            offset += len(func.name) + 1
+            for c in func.name:
+                line = char_lines.get(c)
+                if line is None:
+                    line = char_lines[c] = "   '{0}',\n".format(c)
+                lines.append(line)
+            lines.append('   0, // {0}\n'.format(func.name))
+        self.out(''.join(lines))
         self.outln('    0 };')
         # We're using uint16_t for the offsets.
         #assert(offset < 65536)
@@ -705,12 +906,13 @@ class Generator(object):
         self.outln('    for (i = 0; providers[i] != {0}_provider_terminator; i++) {{'.format(self.target))
         self.outln('        switch (providers[i]) {')
 
-        for human_name in sorted(self.provider_enum.keys()):
-            enum = self.provider_enum[human_name]
-            self.outln('        case {0}:'.format(enum))
-            self.outln('            if ({0})'.format(self.provider_condition[human_name]))
-            self.outln('                return {0};'.format(self.provider_loader[human_name]).format("entrypoint_strings + entrypoints[i]"))
-            self.outln('            break;')
+        self.out(''.join('        case {0}:\n'
+                         '            if ({1})\n'
+                         '                return {2};\n'
+                         '            break;\n'.format(self.provider_enum[human_name],
+                                                       self.provider_condition[human_name],
+                                                       self.provider_loader_expr[human_name])
+                         for human_name in self.sorted_providers))
 
         self.outln('        case {0}_provider_terminator:'.format(self.target))
         self.outln('            abort(); /* Not reached */')
@@ -755,8 +957,8 @@ class Generator(object):
         self.outln('}')
         self.outln('')
 
-    def write_source(self, f):
-        self.out_file = open(f, 'w')
+    def write_source(self, out_file):
+        self.out_buf = []
 
         self.outln('/* GL dispatch code.')
         self.outln(' * This is code-generated from the GL API XML files from Khronos.')
@@ -779,19 +981,23 @@ class Generator(object):
         self.outln('#endif')
 
         self.outln('struct dispatch_table {')
-        for func in self.sorted_functions:
-            self.outln('    {0} epoxy_{1};'.format(func.ptr_type, func.wrapped_name))
+        self.out(''.join('    {0} epoxy_{1};\n'.format(func.ptr_type, func.wrapped_name)
+                         for func in self.sorted_functions))
         self.outln('};')
         self.outln('')
 
-        # Early declaration, so we can declare the real thing at the
-        # bottom. (I want the function_ptr_resolver as the first
-        # per-GL-call code, since it's the most interesting to see
-        # when you search for the implementation of a call)
+        # The thunks need get_dispatch_table(), so it and the TLS slot
+        # it reads go ahead of them.  The rest of the dispatch table
+        # code refers to the thunks and lives at the bottom.
         self.outln('#if USING_DISPATCH_TABLE')
-        self.outln('static inline struct dispatch_table *')
-        self.outln('get_dispatch_table(void);')
+        self.outln('uint32_t {0}_tls_index;'.format(self.target))
+        self.outln('uint32_t {0}_tls_size = sizeof(struct dispatch_table);'.format(self.target))
         self.outln('')
+        self.outln('static inline struct dispatch_table *')
+        self.outln('get_dispatch_table(void)')
+        self.outln('{')
+        self.outln('	return TlsGetValue({0}_tls_index);'.format(self.target))
+        self.outln('}')
         self.outln('#endif')
 
         self.write_provider_enums()
@@ -799,32 +1005,22 @@ class Generator(object):
         self.write_entrypoint_strings()
         self.write_provider_resolver()
 
+        # Everything that's specific to one function and doesn't
+        # depend on USING_DISPATCH_TABLE is written out together, in a
+        # single pass over the functions.
         for func in self.sorted_functions:
             self.write_function_ptr_resolver(func)
-
-        for func in self.sorted_functions:
             self.write_thunks(func)
-        self.outln('')
+            self.write_function_pointer(func)
 
         self.outln('#if USING_DISPATCH_TABLE')
 
         self.outln('static struct dispatch_table resolver_table = {')
-        for func in self.sorted_functions:
-            self.outln('    epoxy_{0}_dispatch_table_rewrite_ptr, /* {0} */'.format(func.wrapped_name))
+        self.out(''.join('    epoxy_{0}_dispatch_table_rewrite_ptr, /* {0} */\n'.format(func.wrapped_name)
+                         for func in self.sorted_functions))
         self.outln('};')
         self.outln('')
 
-        self.outln('uint32_t {0}_tls_index;'.format(self.target))
-        self.outln('uint32_t {0}_tls_size = sizeof(struct dispatch_table);'.format(self.target))
-        self.outln('')
-
-        self.outln('static inline struct dispatch_table *')
-        self.outln('get_dispatch_table(void)')
-        self.outln('{')
-        self.outln('	return TlsGetValue({0}_tls_index);'.format(self.target))
-        self.outln('}')
-        self.outln('')
-
         self.outln('void')
         self.outln('{0}_init_dispatch_table(void)'.format(self.target))
         self.outln('{')
@@ -837,54 +1033,20 @@ class Generator(object):
         self.outln('{0}_switch_to_dispatch_table(void)'.format(self.target))
         self.outln('{')
 
-        for func in self.sorted_functions:
-            self.outln('    epoxy_{0} = epoxy_{0}_dispatch_table_thunk;'.format(func.wrapped_name))
+        self.out(''.join('    epoxy_{0} = epoxy_{0}_dispatch_table_thunk;\n'.format(func.wrapped_name)
+                         for func in self.sorted_functions))
 
         self.outln('}')
         self.outln('')
 
         self.outln('#endif /* !USING_DISPATCH_TABLE */')
 
-        for func in self.sorted_functions:
-            self.write_function_pointer(func)
+        self.write_out_file(out_file)
 
-argparser = argparse.ArgumentParser(description='Generate GL dispatch wrappers.')
-argparser.add_argument('files', metavar='file.xml', nargs='+', help='GL API XML files to be parsed')
-argparser.add_argument('--outputdir', metavar='dir', required=False, help='Destination directory for files (default to current dir)')
-argparser.add_argument('--includedir', metavar='dir', required=False, help='Destination directory for headers')
-argparser.add_argument('--srcdir', metavar='dir', required=False, help='Destination directory for source')
-argparser.add_argument('--source', dest='source', action='store_true', required=False, help='Generate the source file')
-argparser.add_argument('--no-source', dest='source', action='store_false', required=False, help='Do not generate the source file')
-argparser.add_argument('--header', dest='header', action='store_true', required=False, help='Generate the header file')
-argparser.add_argument('--no-header', dest='header', action='store_false', required=False, help='Do not generate the header file')
-args = argparser.parse_args()
-
-if args.outputdir:
-    outputdir = args.outputdir
-else:
-    outputdir = os.getcwd()
-
-if args.includedir:
-    includedir = args.includedir
-else:
-    includedir = outputdir
-
-if args.srcdir:
-    srcdir = args.srcdir
-else:
-    srcdir = outputdir
-
-build_source = args.source
-build_header = args.header
-
-if not build_source and not build_header:
-    build_source = True
-    build_header = True
-
-for f in args.files:
-    name = os.path.basename(f).split('.xml')[0]
+def generate(xml_file, includedir, srcdir, build_header, build_source):
+    name = os.path.basename(xml_file).split('.xml')[0]
     generator = Generator(name)
-    generator.parse(f)
+    generator.parse(xml_file)
 
     generator.drop_weird_glx_functions()
 
@@ -912,3 +1074,63 @@ for f in args.files:
         generator.write_header(os.path.join(includedir, name + '_generated.h'))
     if build_source:
         generator.write_source(os.path.join(srcdir, name + '_generated_dispatch.c'))
+
+def main():
+    argparser = argparse.ArgumentParser(description='Generate GL dispatch wrappers.')
+    argparser.add_argument('files', metavar='file.xml', nargs='+', help='GL API XML files to be parsed')
+    argparser.add_argument('--outputdir', metavar='dir', required=False, help='Destination directory for files (default to current dir)')
+    argparser.add_argument('--includedir', metavar='dir', required=False, help='Destination directory for headers')
+    argparser.add_argument('--srcdir', metavar='dir', required=False, help='Destination directory for source')
+    argparser.add_argument('--source', dest='source', action='store_true', required=False, help='Generate the source file')
+    argparser.add_argument('--no-source', dest='source', action='store_false', required=False, help='Do not generate the source file')
+    argparser.add_argument('--header', dest='header', action='store_true', required=False, help='Generate the header file')
+    argparser.add_argument('--no-header', dest='header', action='store_false', required=False, help='Do not generate the header file')
+    args = argparser.parse_args()
+
+    if args.outputdir:
+        outputdir = args.outputdir
+    else:
+        outputdir = os.getcwd()
+
+    if args.includedir:
+        includedir = args.includedir
+    else:
+        includedir = outputdir
+
+    if args.srcdir:
+        srcdir = args.srcdir
+    else:
+        srcdir = outputdir
+
+    build_source = args.source
+    build_header = args.header
+
+    if not build_source and not build_header:
+        build_source = True
+        build_header = True
+
+    try:
+        import concurrent.futures
+    except ImportError:
+        # Python 2
+        concurrent = None
+
+    # Each registry is generated independently, into its own files, so
+    # when we're given several of them they can be done in parallel.
+    # Don't start more workers than there are files to generate, and
+    # don't bother with a pool at all if there would only be one.
+    workers = min(len(args.files), multiprocessing.cpu_count())
+    if workers == 1 or concurrent is None:
+        for f in args.files:
+            generate(f, includedir, srcdir, build_header, build_source)
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        jobs = [executor.submit(generate, f, includedir, srcdir,
+                                build_header, build_source)
+                for f in args.files]
+        for job in jobs:
+            job.result()
+
+if __name__ == '__main__':
+    main()